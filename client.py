@@ -1,5 +1,10 @@
 import asyncio
+import logging
+import os
+import queue
+import sys
 import time
+from logging.handlers import QueueHandler, QueueListener
 import mlflow
 import mlflow.langchain
 from langchain_community.callbacks import get_openai_callback
@@ -11,6 +16,18 @@ from exam.mcp import ExamMCPServer
 from exam.mlflow import calculate_overhead
 
 
+def setup_logging():
+    """Route 'exam' log records through a queue so console I/O runs on the listener thread, not the event loop."""
+    log_queue = queue.SimpleQueue()
+    exam_logger = logging.getLogger("exam")
+    exam_logger.setLevel(logging.WARNING if os.getenv("EXAM_MCP_QUIET") else logging.INFO)
+    exam_logger.addHandler(QueueHandler(log_queue))
+    exam_logger.propagate = False
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    return listener
+
+
 async def main():
     console_handler = StdOutCallbackHandler()
     my_callbacks = [console_handler]
@@ -124,4 +141,8 @@ async def main():
             mlflow.log_metric("duration_seconds", duration)
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    log_listener = setup_logging()
+    try:
+        asyncio.run(main())
+    finally:
+        log_listener.stop()
\ No newline at end of file
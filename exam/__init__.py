@@ -1,16 +1,26 @@
 import csv
+import re
 import xml
 from dataclasses import dataclass
 import xml.etree.ElementTree as xml
 from pathlib import Path
 from io import StringIO
+import yaml
 from markdown import markdown
 
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as YamlLoader
+
 DIR_ROOT = Path(__file__).parent.parent
 DEFAULT_QUESTIONS_FILE = DIR_ROOT / "static" / "questions.csv"
 
 _QUESTIONS_STORE_INSTANCE = None
 
+# Parsed YAML files by path, as ((mtime_ns, size), data): re-parsed only when the file changes
+_YAML_CACHE = {}
+
 
 def get_questions_store(questions=DEFAULT_QUESTIONS_FILE):
     """
@@ -23,6 +33,20 @@ def get_questions_store(questions=DEFAULT_QUESTIONS_FILE):
     return _QUESTIONS_STORE_INSTANCE
 
 
+def load_yaml(path: Path):
+    """
+    Parse a YAML file with the libyaml-backed loader when available.
+    The parsed data is cached and reused until the file's mtime or size changes, so callers must not mutate it.
+    """
+    stat = path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _YAML_CACHE.get(str(path))
+    if cached is None or cached[0] != stamp:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = _YAML_CACHE[str(path)] = (stamp, yaml.load(f, Loader=YamlLoader))
+    return cached[1]
+
+
 def load_exam_from_yaml(questions_file: str, responses_file: str, grades_file: str = None, exams_dir=None):
     """
     Load an entire exam from YAML files.
@@ -44,10 +68,6 @@ def load_exam_from_yaml(questions_file: str, responses_file: str, grades_file: s
         FileNotFoundError: If required files don't exist
         ValueError: If YAML parsing fails
     """
-    import yaml
-    import re
-    from pathlib import Path
-
     if exams_dir is None:
         exams_dir = DIR_ROOT / "static" / "se-exams"
     else:
@@ -76,11 +96,8 @@ def load_exam_from_yaml(questions_file: str, responses_file: str, grades_file: s
         )
 
     # Load YAML files
-    with open(questions_path, 'r', encoding='utf-8') as f:
-        questions_data = yaml.safe_load(f)
-
-    with open(responses_path, 'r', encoding='utf-8') as f:
-        responses_data = yaml.safe_load(f)
+    questions_data = load_yaml(questions_path)
+    responses_data = load_yaml(responses_path)
 
     # Load grades file if provided
     grades_data = None
@@ -91,8 +108,7 @@ def load_exam_from_yaml(questions_file: str, responses_file: str, grades_file: s
             grades_path = exams_dir / grades_file
 
         if grades_path.exists():
-            with open(grades_path, 'r', encoding='utf-8') as f:
-                grades_data = yaml.safe_load(f)
+            grades_data = load_yaml(grades_path)
         else:
             print(f"[LOAD_EXAM] Warning: grades file not found: {grades_path}")
 
@@ -132,6 +148,7 @@ def load_exam_from_yaml(questions_file: str, responses_file: str, grades_file: s
             })
 
     # Parse students
+    response_keys = [(i, f"response{i}") for i in range(1, len(questions) + 1)]
     students = []
     for student_data in responses_data:
         if student_data.get("state") != "Finished":
@@ -141,12 +158,10 @@ def load_exam_from_yaml(questions_file: str, responses_file: str, grades_file: s
 
         # Extract responses
         responses = {}
-        for i in range(1, len(questions) + 1):
-            response_key = f"response{i}"
-            if response_key in student_data:
-                response_text = student_data[response_key]
-                if response_text and response_text.strip() != '-':
-                    responses[i] = response_text
+        for i, response_key in response_keys:
+            response_text = student_data.get(response_key)
+            if response_text and response_text.strip() != '-':
+                responses[i] = response_text
 
         students.append({
             "email": email,
@@ -280,28 +295,42 @@ def group_by_category(questions):
     return questions_by_category
 
 
+def _normalize_id(id: str) -> str:
+    return id.replace(" ", "").replace("-", "").lower()
+
+
 class QuestionsStore:
     def __init__(self, questions=DEFAULT_QUESTIONS_FILE):
         if isinstance(questions, Path) or isinstance(questions, str):
             questions = load_questions_from_csv(questions)
         questions = [q.copy() for q in questions]
-        self.__questions_by_category = group_by_category(questions)
+        self.__questions_by_category = {
+            category: sorted(question_list, key=lambda x: x.id)
+            for category, question_list in group_by_category(questions).items()
+        }
         self.__questions_by_id = {q.id: q for question_list in self.__questions_by_category.values() for q in
                                   question_list}
+        # Indici per la ricerca case-insensitive e fuzzy (il primo id che collide vince, come nella scansione)
+        self.__questions_by_lower_id = {}
+        self.__questions_by_normalized_id = {}
+        for qid, question in self.__questions_by_id.items():
+            self.__questions_by_lower_id.setdefault(qid.lower(), question)
+            self.__questions_by_normalized_id.setdefault(_normalize_id(qid), question)
         self.__categories = tuple(sorted(self.__questions_by_category.keys(), key=lambda x: x.name))
+        self.__questions = tuple(sorted(self.__questions_by_id.values(), key=lambda x: x.id))
 
     @property
     def categories(self):
-        return sorted(self.__categories, key=lambda x: x.name)
+        return list(self.__categories)
 
     @property
     def questions(self):
-        return sorted(self.__questions_by_id.values(), key=lambda x: x.id)
+        return list(self.__questions)
 
     def category(self, category):
         if not isinstance(category, Category):
             category = Category(category)
-        if category not in self.__categories:
+        if category not in self.__questions_by_category:
             raise KeyError(f"Category {category} not found")
         return category
 
@@ -311,17 +340,12 @@ class QuestionsStore:
             return self.__questions_by_id[id]
 
         # Prova ricerca case-insensitive
-        id_lower = id.lower()
-        for qid, question in self.__questions_by_id.items():
-            if qid.lower() == id_lower:
-                return question
+        if (question := self.__questions_by_lower_id.get(id.lower())) is not None:
+            return question
 
         # Prova ricerca fuzzy (rimuovi spazi, trattini)
-        id_normalized = id.replace(" ", "").replace("-", "").lower()
-        for qid, question in self.__questions_by_id.items():
-            qid_normalized = qid.replace(" ", "").replace("-", "").lower()
-            if qid_normalized == id_normalized:
-                return question
+        if (question := self.__questions_by_normalized_id.get(_normalize_id(id))) is not None:
+            return question
 
         # Se ancora non trovato, mostra quali sono disponibili
         available_ids = list(self.__questions_by_id.keys())
@@ -332,7 +356,7 @@ class QuestionsStore:
 
     def questions_in_category(self, category):
         category = self.category(category)
-        return sorted(self.__questions_by_category.get(category, []), key=lambda x: x.id)
+        return list(self.__questions_by_category.get(category, []))
 
     def category_size(self, category):
         category = self.category(category)
@@ -343,7 +367,7 @@ class QuestionsStore:
         return sum(q.weight for q in self.__questions_by_category.get(category, []))
 
     def __len__(self):
-        return len(self.questions)
+        return len(self.__questions_by_id)
 
     def __total_weight(self):
         return sum(q.weight for q in self.__questions_by_id.values())
@@ -1,16 +1,24 @@
+import asyncio
+import hashlib
 import os
 import re
 import sys
-import json
+import tempfile
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
+from functools import cached_property
 from pathlib import Path
+from string import Formatter
 
+import orjson
+from openai import APIConnectionError, InternalServerError, RateLimitError
 from pydantic import BaseModel, Field
 
 from exam import DIR_ROOT
 from exam import get_questions_store
-from exam.solution import Answer
+from exam.llm_provider import llm_client
+from exam.solution import Answer, load_cache as load_answer_cache
 
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", None)
 if OUTPUT_FILE:
@@ -18,12 +26,39 @@ if OUTPUT_FILE:
 else:
     OUTPUT_FILE = sys.stdout
 
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", 8))
+
+# Errori transitori del provider (rate limit, timeout, rete, 5xx): la chiamata LLM viene ritentata
+TRANSIENT_LLM_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+LLM_RETRIES = 2
+
+# Numero massimo di esiti per feature conservati in memoria (i meno usati di recente vengono scartati)
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", 4096))
+
 ALL_QUESTIONS = get_questions_store()
 PATTERN_QUESTION_FOLDER = re.compile(r"^Q\d+\s+-\s+(\w+-\d+)$")
 FILE_TEMPLATE = DIR_ROOT / "exam" / "assess" / "prompt-template.txt"
 TEMPLATE = FILE_TEMPLATE.read_text(encoding="utf-8")
 
 
+def _compile_prompt(template: str):
+    """
+    Converte i placeholder `{name}` del template in `%(name)s` una sola volta,
+    così ogni prompt è costruito con una singola formattazione `%` senza ri-analizzare il template.
+    """
+    parts = []
+    for literal, field_name, _, _ in Formatter().parse(template):
+        parts.append(literal.replace("%", "%%"))
+        if field_name is not None:
+            parts.append(f"%({field_name})s")
+    compiled = "".join(parts)
+    return lambda **fields: compiled % fields
+
+
+# Il template è diviso attorno a {answer}: le due parti dipendono solo da domanda e feature
+_TEMPLATE_HEAD_FN, _TEMPLATE_TAIL_FN = (_compile_prompt(part) for part in TEMPLATE.split("{answer}", 1))
+
+
 class FeatureType(str, Enum):
     """Enumeration of feature types that can be assessed in a question's answer."""
     CORE = "core"
@@ -49,14 +84,14 @@ class Feature:
     @property
     def is_core(self) -> bool:
         """Determina se questa feature è core (essenziale)."""
-        return self.type == FeatureType.CORE
+        return self.type is FeatureType.CORE
 
     @property
     def weight_percentage(self) -> float:
         """Restituisce il peso percentuale di questa feature nel punteggio totale."""
-        if self.type == FeatureType.CORE:
+        if self.type is FeatureType.CORE:
             return 0.70  # 70% del punteggio
-        elif self.type == FeatureType.DETAILS_IMPORTANT:
+        elif self.type is FeatureType.DETAILS_IMPORTANT:
             return 0.20  # 20% del punteggio
         else:  # DETAILS_ADDITIONAL
             return 0.10  # 10% del punteggio
@@ -79,6 +114,23 @@ def enumerate_features(answer: Answer):
         i += 1
 
 
+def _write_atomically(path: Path, data: bytes):
+    """
+    Scrive su un file temporaneo e lo rinomina, così un'interruzione non lascia file troncati.
+    Il temporaneo ha un nome univoco nella stessa directory, così scritture concorrenti dello stesso file non si intralciano.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # mkstemp crea il file con permessi 0600: si usano quelli di un file normale
+            os.fchmod(f.fileno(), 0o644)
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
 class FeatureAssessment(BaseModel):
     satisfied: bool = Field(description="Whether the feature is present in the answer")
     motivation: str = Field(description="Explanation of why the feature is present or not")
@@ -97,9 +149,19 @@ class Assessor:
         Args:
             evaluations_dir: Directory per salvare le valutazioni (default: DIR_ROOT/evaluations)
         """
-        from exam.llm_provider import llm_client
         self.llm_client_func = llm_client
 
+        # Limita le chiamate LLM concorrenti per non incorrere nei rate limit del provider
+        self.llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+        # Prompt parziali per domanda: {question_id: (checklist, [(feature, head, tail), ...])}
+        self.prompt_cache = {}
+
+        # Esiti per feature, in corso o completati, in ordine LRU:
+        # {(question_id, feature_type, feature, digest risposta): Task[FeatureAssessment]}
+        # Durano quanto l'Assessor: per ExamMCPServer.assessor, l'intero processo del server, non un solo batch.
+        self.feature_cache = OrderedDict()
+
         # Setup evaluations directory
         if evaluations_dir is None:
             self.evaluations_dir = DIR_ROOT / "evaluations"
@@ -108,6 +170,70 @@ class Assessor:
 
         self.evaluations_dir.mkdir(parents=True, exist_ok=True)
 
+    @cached_property
+    def feature_llm(self):
+        """Client LLM con output strutturato FeatureAssessment, creato una sola volta e condiviso tra le chiamate."""
+        llm, _, _ = self.llm_client_func(structured_output=FeatureAssessment)
+        return llm
+
+    def feature_prompts(self, question, checklist) -> list[tuple[Feature, str, str]]:
+        """
+        Restituisce, per ogni feature della checklist, le parti del prompt prima e dopo la risposta.
+        Non dipendono dallo studente, quindi sono calcolate una sola volta per domanda e checklist.
+        """
+        cached = self.prompt_cache.get(question.id)
+        if cached is None or cached[0] is not checklist:
+            prompts = []
+            for _, feature in enumerate_features(checklist):
+                fields = dict(
+                    class_name="FeatureAssessment",
+                    question=question.text,
+                    feature_type=feature.type.value,
+                    feature_verb_ideal=feature.verb_ideal,
+                    feature_verb_actual=feature.verb_actual,
+                    feature=feature.description
+                )
+                prompts.append((feature, _TEMPLATE_HEAD_FN(**fields), _TEMPLATE_TAIL_FN(**fields)))
+            cached = self.prompt_cache[question.id] = (checklist, prompts)
+        return cached[1]
+
+    async def invoke_feature_llm(self, prompt: str) -> FeatureAssessment:
+        """
+        Chiama il modello LLM tramite il client asincrono nativo, senza occupare un thread per chiamata.
+        Gli errori transitori vengono ritentati con backoff esponenziale; gli altri si propagano subito.
+        """
+        for attempt in range(LLM_RETRIES + 1):
+            try:
+                async with self.llm_semaphore:
+                    return await self.feature_llm.ainvoke(prompt)
+            except TRANSIENT_LLM_ERRORS:
+                if attempt == LLM_RETRIES:
+                    raise
+            # Attesa fuori dal semaforo, per non bloccare le altre chiamate
+            await asyncio.sleep(2 ** attempt)
+
+    def cached_feature_assessment(self, key: tuple, prompt: str) -> asyncio.Task:
+        """
+        Restituisce il task che valuta il prompt per la chiave data, creandolo solo se non esiste già.
+        Il task viene registrato prima di qualsiasi await, così le valutazioni concorrenti di risposte
+        identiche condividono la stessa chiamata LLM. I task falliti vengono rimossi, per essere ritentati.
+        """
+        task = self.feature_cache.get(key)
+        if task is not None:
+            self.feature_cache.move_to_end(key)
+            return task
+
+        task = self.feature_cache[key] = asyncio.ensure_future(self.invoke_feature_llm(prompt))
+
+        def forget_if_failed(done: asyncio.Task):
+            if (done.cancelled() or done.exception() is not None) and self.feature_cache.get(key) is done:
+                del self.feature_cache[key]
+
+        task.add_done_callback(forget_if_failed)
+        if len(self.feature_cache) > FEATURE_CACHE_SIZE:
+            self.feature_cache.popitem(last=False)
+        return task
+
     async def assess_single_answer(
             self,
             question,
@@ -146,22 +272,21 @@ class Assessor:
             feature_assessments_list = []
             feature_assessments_dict = {}
 
-            for index, feature in enumerate_features(checklist):
-                # Prepara il prompt
-                prompt = TEMPLATE.format(
-                    class_name="FeatureAssessment",
-                    question=question.text,
-                    feature_type=feature.type.value,
-                    feature_verb_ideal=feature.verb_ideal,
-                    feature_verb_actual=feature.verb_actual,
-                    feature=feature.description,
-                    answer=student_response
-                )
+            prompts = self.feature_prompts(question, checklist)
 
-                # Chiama il modello LLM
-                llm, _, _ = self.llm_client_func(structured_output=FeatureAssessment)
-                result = llm.invoke(prompt)
+            answer_digest = hashlib.blake2b(student_response.encode("utf-8"), digest_size=16).digest()
 
+            async def assess_feature(feature, head, tail):
+                # Risposte identiche alla stessa feature condividono la stessa chiamata LLM
+                key = (question.id, feature.type, feature.description, answer_digest)
+                task = self.cached_feature_assessment(key, head + student_response + tail)
+                # shield: se questa valutazione viene annullata, il task resta disponibile per gli altri
+                return await asyncio.shield(task)
+
+            # Le feature sono indipendenti, quindi valutate in parallelo
+            results = await asyncio.gather(*(assess_feature(*prompt) for prompt in prompts))
+
+            for (feature, _, _), result in zip(prompts, results):
                 # Salva risultati
                 feature_assessments_list.append({
                     "feature": feature.description,
@@ -228,27 +353,19 @@ class Assessor:
                 - assessments: list di assessment per ogni domanda
                 - saved_files: dict con percorsi dei file salvati (se save_results=True)
         """
-        from exam.solution import load_cache as load_answer_cache
-
-        assessments = []
-        total_score = 0.0
-        total_max_score = 0.0
-
-        for question_info in exam_questions:
+        async def assess_question(question_info) -> dict:
             question_num = int(question_info["number"].replace("Question ", ""))
 
             # Verifica se lo studente ha risposto
             if question_num not in student_responses:
-                assessments.append({
+                return {
                     "question_number": question_num,
                     "question_id": question_info["id"],
                     "question_text": question_info.get("text", ""),
                     "status": "no_response",
                     "score": 0.0,
                     "max_score": question_info["score"]
-                })
-                total_max_score += question_info["score"]
-                continue
+                }
 
             try:
                 # Ottieni la domanda e la checklist
@@ -282,13 +399,10 @@ class Assessor:
                     "student_response": response_text
                 })
 
-                assessments.append(assessment)
-
-                total_score += assessment["score"]
-                total_max_score += question_info["score"]
+                return assessment
 
             except Exception as e:
-                assessments.append({
+                return {
                     "question_number": question_num,
                     "question_id": question_info["id"],
                     "question_text": question_info.get("text", ""),
@@ -296,8 +410,13 @@ class Assessor:
                     "error": str(e),
                     "score": 0.0,
                     "max_score": question_info["score"]
-                })
-                total_max_score += question_info["score"]
+                }
+
+        # Le domande sono indipendenti: le chiamate LLM restano limitate da self.llm_semaphore
+        assessments = await asyncio.gather(*(assess_question(q) for q in exam_questions))
+
+        total_score = sum((assessment["score"] for assessment in assessments), 0.0)
+        total_max_score = sum((question_info["score"] for question_info in exam_questions), 0.0)
 
         result = {
             "student_email": student_email,
@@ -313,12 +432,12 @@ class Assessor:
         # NUOVA LOGICA: Salvataggio risultati (spostata da MCP)
         # =========================================================
         if save_results:
-            saved_files = self._save_assessment_results(student_email, result, exam_questions)
+            saved_files = await self._save_assessment_results(student_email, result, exam_questions)
             result["saved_files"] = saved_files
 
         return result
 
-    def _save_assessment_results(self, student_email: str, result: dict, exam_questions: list) -> dict:
+    async def _save_assessment_results(self, student_email: str, result: dict, exam_questions: list) -> dict:
         """
         Salva i risultati della valutazione su file.
 
@@ -334,19 +453,25 @@ class Assessor:
         """
         # Crea directory studente
         student_dir = self.evaluations_dir / student_email
-        student_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(student_dir.mkdir, parents=True, exist_ok=True)
 
-        # Salva assessment completo in JSON
         assessment_file = student_dir / "assessment.json"
-        with open(assessment_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
-
-        # Salva summary leggibile
         summary_file = student_dir / "summary.txt"
-        summary_content = self._generate_summary_text(student_email, result, exam_questions)
 
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            f.write(summary_content)
+        def write_assessment():
+            # Assessment completo in JSON (orjson emette direttamente UTF-8)
+            _write_atomically(assessment_file, orjson.dumps(
+                result,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+            ))
+
+        def write_summary():
+            # Summary leggibile
+            summary_content = self._generate_summary_text(student_email, result, exam_questions)
+            _write_atomically(summary_file, summary_content.encode('utf-8'))
+
+        # I due file sono indipendenti: scritti in parallelo, fuori dall'event loop
+        await asyncio.gather(asyncio.to_thread(write_assessment), asyncio.to_thread(write_summary))
 
         return {
             "assessment": str(assessment_file),
@@ -406,11 +531,13 @@ class Assessor:
                 lines.append(f"Breakdown: {assessment['breakdown']}")
                 lines.append("")
 
-                # Raggruppa per tipo
-                core_features = [fa for fa in assessment['feature_assessments']
-                                 if fa['feature_type'] == 'CORE']
-                important_features = [fa for fa in assessment['feature_assessments']
-                                      if fa['feature_type'] == 'DETAILS_IMPORTANT']
+                # Raggruppa per tipo in un solo passaggio
+                core_features, important_features = [], []
+                for fa in assessment['feature_assessments']:
+                    if fa['feature_type'] == 'CORE':
+                        core_features.append(fa)
+                    elif fa['feature_type'] == 'DETAILS_IMPORTANT':
+                        important_features.append(fa)
 
                 if core_features:
                     lines.append("CORE Elements:")
@@ -457,14 +584,18 @@ class Assessor:
         if not assessments:
             return 0.0, "No features assessed", {}
 
-        # Conta feature per tipo
-        core_total = sum(1 for f in assessments if f.type == FeatureType.CORE)
-        core_satisfied = sum(1 for f, a in assessments.items()
-                             if f.type == FeatureType.CORE and a.satisfied)
-
-        important_total = sum(1 for f in assessments if f.type == FeatureType.DETAILS_IMPORTANT)
-        important_satisfied = sum(1 for f, a in assessments.items()
-                                  if f.type == FeatureType.DETAILS_IMPORTANT and a.satisfied)
+        # Conta feature per tipo in un solo passaggio
+        core_total = core_satisfied = 0
+        important_total = important_satisfied = 0
+        for f, a in assessments.items():
+            if f.type is FeatureType.CORE:
+                core_total += 1
+                if a.satisfied:
+                    core_satisfied += 1
+            elif f.type is FeatureType.DETAILS_IMPORTANT:
+                important_total += 1
+                if a.satisfied:
+                    important_satisfied += 1
 
         # Determina i pesi in base a cosa è presente
         if core_total > 0 and important_total > 0:
@@ -1,5 +1,6 @@
 import getpass
 import os
+from functools import lru_cache
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 from langchain.chat_models import init_chat_model
@@ -25,9 +26,11 @@ def ensure_openai_api_key():
         os.environ[KEY_OPENAI_API_KEY] = getpass.getpass("Enter API key for OpenAI: ")
     return os.environ[KEY_OPENAI_API_KEY]
 
+@lru_cache(maxsize=None)
 def llm_client(model_name: str = None, model_provider: str = "groq", structured_output: type = None):
     """
     Creates an LLM client configured for Groq.
+    Clients are memoized per arguments, so the same structured-output client (and its connection pool) is reused.
     
     Args:
         model_name: gpt-4.1-mini
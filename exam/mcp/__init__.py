@@ -3,10 +3,17 @@ MCP Server with Shared Context - LEAN VERSION.
 Optimized to reduce token usage by returning concise summaries.
 """
 
-import json
+import asyncio
+import bisect
+import logging
+import os
+import signal
+import sys
 from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Dict
 
+import orjson
 from langchain.tools import tool
 
 from exam import DIR_ROOT
@@ -16,30 +23,92 @@ from exam.solution import Answer, load_cache as load_answer_cache
 from mlflow.entities import SpanType
 import mlflow
 
+logger = logging.getLogger(__name__)
+
+# Students assessed concurrently by assess_students_batch (LLM calls are further bounded by the Assessor)
+EXAM_CONCURRENCY = int(os.getenv("EXAM_CONCURRENCY", 8))
+
+
+def _dumps(obj) -> str:
+    """Serialize a tool result to compact JSON: tool outputs are read by the agents, not by humans."""
+    return orjson.dumps(obj).decode()
+
+
+async def bounded_map(fn, items, concurrency: int = EXAM_CONCURRENCY) -> list:
+    """
+    Await fn(item) for every item, with at most `concurrency` calls in flight.
+    A fixed pool of workers pulls items from a queue, so tasks are not created for the whole batch up front.
+    An exception raised by a call is returned in place of its result. Results are in input order.
+    """
+    results = []
+    queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        results.append(None)
+        queue.put_nowait((index, item))
+
+    async def worker():
+        while not queue.empty():
+            index, item = queue.get_nowait()
+            try:
+                results[index] = await fn(item)
+            except Exception as e:
+                results[index] = e
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(results)))))
+    return results
 
 
 @dataclass
 class AssessmentContext:
     """Shared context between tool calls."""
     # Cache of loaded data
-    loaded_answers: Dict[str, str] = field(default_factory=dict)
+    loaded_answers: Dict[tuple[str, str], str] = field(default_factory=dict)
     loaded_checklists: Dict[str, Answer] = field(default_factory=dict)
     loaded_exams = {}
 
     # Assessment results
-    feature_assessments: Dict[str, list] = field(default_factory=dict)
+    feature_assessments: Dict[tuple[str, str], list] = field(default_factory=dict)
+
+    # Index of loaded students by lowercase email, rebuilt whenever an exam is loaded
+    students_by_email: Dict[str, tuple] = field(default_factory=dict)
 
-    def get_session_id(self, question_id: str, student_code: str) -> str:
-        return f"{question_id}_{student_code}"
+    # Sorted keys of students_by_email, for prefix lookups by bisection
+    sorted_emails: list = field(default_factory=list)
+
+    def store_exam(self, exam_id: str, exam_data: dict):
+        self.loaded_exams[exam_id] = exam_data
+        self.students_by_email = {}
+        for loaded in self.loaded_exams.values():
+            for student in loaded["students"]:
+                self.students_by_email.setdefault(student["email"].lower(), (student, loaded["questions"]))
+        self.sorted_emails = sorted(self.students_by_email)
+
+    def find_student(self, student_email: str) -> tuple[dict | None, list | None]:
+        """
+        Find a loaded student by email (case-insensitive), or by a prefix of at least 10 characters.
+        Returns (student, exam_questions), or (None, None) if no loaded exam contains the student.
+        """
+        email = student_email.rstrip('.').strip().lower()
+        if email in self.students_by_email:
+            return self.students_by_email[email]
+        if len(email) >= 10:
+            # The first email not smaller than the prefix is the only candidate that can start with it
+            i = bisect.bisect_left(self.sorted_emails, email)
+            if i < len(self.sorted_emails) and self.sorted_emails[i].startswith(email):
+                return self.students_by_email[self.sorted_emails[i]]
+        return None, None
+
+    def get_session_id(self, question_id: str, student_code: str) -> tuple[str, str]:
+        # Tuple keys: no string formatting per lookup, and no collisions on ids containing '_'
+        return question_id, student_code
 
     def store_answer(self, question_id: str, student_code: str, answer: str):
-        key = f"{question_id}_{student_code}"
+        key = self.get_session_id(question_id, student_code)
         self.loaded_answers[key] = answer
         return key
 
     def get_answer(self, question_id: str, student_code: str) -> str | None:
-        key = f"{question_id}_{student_code}"
-        return self.loaded_answers.get(key)
+        return self.loaded_answers.get(self.get_session_id(question_id, student_code))
 
     def store_checklist(self, question_id: str, checklist: Answer):
         self.loaded_checklists[question_id] = checklist
@@ -69,6 +138,9 @@ class ExamMCPServer:
     evaluations_dir = DIR_ROOT / "evaluations"
     evaluations_dir.mkdir(parents=True, exist_ok=True)
 
+    # Shared assessor: its LLM client and prompt cache are reused across tool calls
+    assessor = Assessor(evaluations_dir=evaluations_dir)
+
     # Directory for YAML exam files
     exams_dir = DIR_ROOT / "static" / "se-exams"
     exams_dir.mkdir(parents=True, exist_ok=True)
@@ -82,15 +154,16 @@ class ExamMCPServer:
         """
         Retrieve the list of all student emails currently loaded in the exam context.
         """
-        students = []
-        for exam_data in ExamMCPServer.context.loaded_exams.values():
-            for student in exam_data["students"]:
-                students.append(student["email"])
+        students = [
+            student["email"]
+            for exam_data in ExamMCPServer.context.loaded_exams.values()
+            for student in exam_data["students"]
+        ]
 
         if not students:
-            return json.dumps({"error": "No students loaded. Did you run load_exam_tool first?"})
+            return _dumps({"error": "No students loaded. Did you run load_exam_tool first?"})
 
-        return json.dumps(students, indent=2)
+        return _dumps(students)
 
     @staticmethod
     @tool("load_checklist_tool")
@@ -128,7 +201,7 @@ class ExamMCPServer:
 
         status = "batch_completed" if not results["failed"] else "completed_with_errors"
 
-        return json.dumps({
+        return _dumps({
             "status": status,
             "summary": f"Loaded: {results['loaded']}, Cached: {results['skipped_cache']}, Failed: {len(results['failed'])}",
             "failed_ids": results["failed"]  # Restituiamo solo gli errori, che sono importanti
@@ -142,7 +215,8 @@ class ExamMCPServer:
         Load an entire exam from YAML files.
         """
         try:
-            exam_data = load_exam_from_yaml(
+            exam_data = await asyncio.to_thread(
+                load_exam_from_yaml,
                 questions_file=questions_file,
                 responses_file=responses_file,
                 grades_file=grades_file,
@@ -150,7 +224,7 @@ class ExamMCPServer:
             )
 
             exam_id = exam_data["exam_id"]
-            ExamMCPServer.context.loaded_exams[exam_id] = exam_data
+            ExamMCPServer.context.store_exam(exam_id, exam_data)
             question_ids = [q["id"] for q in exam_data["questions"]]
 
             summary_output = {
@@ -164,12 +238,12 @@ class ExamMCPServer:
                 "message": "Exam loaded. Use 'list_loaded_students_tool' to get emails."
             }
 
-            return json.dumps(summary_output, indent=2)
+            return _dumps(summary_output)
 
         except FileNotFoundError as e:
-            return json.dumps({"error": str(e)})
+            return _dumps({"error": str(e)})
         except Exception as e:
-            return json.dumps({"error": str(e)})
+            return _dumps({"error": str(e)})
 
     @staticmethod
     @tool("assess_students_batch_tool")
@@ -182,54 +256,47 @@ class ExamMCPServer:
         results_summary = []
         failed = []
 
-        print(f"\n[BATCH] Starting assessment for {len(student_emails)} students...")
+        logger.info("[BATCH] Starting assessment for %d students...", len(student_emails))
 
-        # Initialize assessor once
-        assessor = Assessor(evaluations_dir=ExamMCPServer.evaluations_dir)
-        questions = None  # Will be fetched from first valid student match
+        assessor = ExamMCPServer.assessor
 
+        # Resolve students up front: a student named twice (repeated email, or email plus prefix)
+        # is assessed once, so concurrent runs never write the same evaluation files
+        students = {}
         for student_email in student_emails:
-            try:
-                student_email_clean = student_email.rstrip('.').strip()
-                student_data = None
-                matched_email = None
-
-                # Logic to find student data in memory
-                for exam_data in ExamMCPServer.context.loaded_exams.values():
-                    for student in exam_data["students"]:
-                        full_email = student["email"]
-                        if (full_email.lower() == student_email_clean.lower() or
-                                (len(student_email_clean) >= 10 and
-                                 full_email.lower().startswith(student_email_clean.lower()))):
-                            student_data = student
-                            questions = exam_data["questions"]
-                            matched_email = full_email
-                            break
-                    if student_data:
-                        break
-
-                if not student_data:
-                    failed.append(f"{student_email} (Not Found)")
-                    continue
-
-                # Perform assessment
-                result = await assessor.assess_student_exam(
-                    student_email=matched_email,
-                    exam_questions=questions,
-                    student_responses=student_data["responses"],
-                    questions_store=ExamMCPServer.questions_store,
-                    context=ExamMCPServer.context,
-                    original_grades=student_data.get("original_grades", {})
-                )
+            student_data, questions = ExamMCPServer.context.find_student(student_email)
+            if not student_data:
+                failed.append(f"{student_email} (Not Found)")
+            else:
+                students.setdefault(student_data["email"], (student_data, questions))
+
+        async def assess_student(matched_email: str) -> str:
+            """Returns the grade line for a loaded student."""
+            student_data, questions = students[matched_email]
+
+            # Perform assessment
+            result = await assessor.assess_student_exam(
+                student_email=matched_email,
+                exam_questions=questions,
+                student_responses=student_data["responses"],
+                questions_store=ExamMCPServer.questions_store,
+                context=ExamMCPServer.context,
+                original_grades=student_data.get("original_grades", {})
+            )
 
-                score = result.get("calculated_score", 0.0)
-                max_score = result.get("max_score", 0.0)
+            score = result.get("calculated_score", 0.0)
+            max_score = result.get("max_score", 0.0)
 
-                print(f"[BATCH] Processed {matched_email[:15]}... Score: {score}")
-                results_summary.append(f"{matched_email}: {score}/{max_score}")
+            logger.info("[BATCH] Processed %.15s... Score: %s", matched_email, score)
+            return f"{matched_email}: {score}/{max_score}"
 
-            except Exception as e:
-                failed.append(f"{student_email} (Error: {str(e)})")
+        # Students are independent: assess them concurrently, keeping the input order in the summary
+        outcomes = await bounded_map(assess_student, students)
+        for matched_email, outcome in zip(students, outcomes):
+            if isinstance(outcome, Exception):
+                failed.append(f"{matched_email} (Error: {str(outcome)})")
+            else:
+                results_summary.append(outcome)
 
         # Return a single summary for the whole batch
         output = {
@@ -239,4 +306,25 @@ class ExamMCPServer:
             "grades_summary": results_summary,
             "failures": failed
         }
-        return json.dumps(output, indent=2)
\ No newline at end of file
+        return _dumps(output)
+
+
+async def run_mcp_server(exam_dir: Path = None):
+    """
+    Keep the MCP server alive until SIGINT/SIGTERM is received.
+    The loop idles on an Event instead of polling, so an idle server never wakes up.
+    """
+    if exam_dir is not None:
+        ExamMCPServer.exams_dir = Path(exam_dir)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows loops have no signal handlers: Ctrl+C raises KeyboardInterrupt, caught in __main__
+            pass
+
+    await stop.wait()
+    print("\n# MCP Server: Shutting down...", file=sys.stderr)
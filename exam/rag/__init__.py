@@ -1,17 +1,26 @@
+import os
+from functools import lru_cache
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import SQLiteVec
 from exam.llm_provider import ensure_openai_api_key
 from exam import DIR_ROOT
+from pathlib import Path
 from pydantic import BaseModel
 import re
 
 
 DIR_CONTENT = DIR_ROOT / "content"
 FILE_DB = DIR_ROOT / "slides-rag.db"
-MARKDOWN_FILES = list(DIR_CONTENT.glob("**/_index.md"))
+MARKDOWN_FILE_NAME = "_index.md"
 REGEX_SLIDE_DELIMITER = re.compile(r"^\s*(---|\+\+\+)")
 
 
+def markdown_files(root=DIR_CONTENT):
+    for dir_path, _, file_names in os.walk(root):
+        if MARKDOWN_FILE_NAME in file_names:
+            yield Path(dir_path) / MARKDOWN_FILE_NAME
+
+
 class Slide(BaseModel):
     content: str
     source: str
@@ -25,7 +34,7 @@ class Slide(BaseModel):
 
 def all_slides(files = None):
     if files is None:
-        files = MARKDOWN_FILES
+        files = markdown_files()
     for file in files:
         with open(file, "r", encoding="utf-8") as f:
             slide_beginning_line_num = 0
@@ -33,7 +42,7 @@ def all_slides(files = None):
             slide_lines = []
             slide_index = 0
             last_was_blank = False
-            for line in f.readlines():
+            for line in f:
                 line_number += 1
                 if REGEX_SLIDE_DELIMITER.match(line):
                     if slide_lines:
@@ -74,6 +83,7 @@ def openai_embeddings(model):
     return OpenAIEmbeddings(model=model)
 
 
+@lru_cache(maxsize=None)
 def sqlite_vector_store(
         db_file: str = str(FILE_DB),
         model: str = None,
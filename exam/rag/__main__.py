@@ -1,5 +1,6 @@
 
 from exam.rag import *
+from itertools import groupby
 import sys
 
 
@@ -9,12 +10,15 @@ vector_store = sqlite_vector_store()
 if any(arg == "--fill" for arg in sys.argv):
     print(f"# vector store created at {FILE_DB}")
 
-    for slide in all_slides():
+    # One add_texts call per file, so all slides of a file are embedded with a single request
+    for source, slides in groupby(all_slides(), key=lambda slide: slide.source):
+        slides = list(slides)
         vector_store.add_texts(
-            texts=[slide.content],
-            metadatas=[{"source": slide.source, "lines": slide.lines, "index": slide.index}],
+            texts=[slide.content for slide in slides],
+            metadatas=[{"source": slide.source, "lines": slide.lines, "index": slide.index} for slide in slides],
         )
-        print(f"# added {slide.lines_count} lines of text from {slide.source} (slide {slide.index}, lines {'%d-%s' % slide.lines}) to vector store")
+        for slide in slides:
+            print(f"# added {slide.lines_count} lines of text from {slide.source} (slide {slide.index}, lines {'%d-%s' % slide.lines}) to vector store")
     print("# vector store filled successfully")
 else:
     print(f"# vector store loaded successfully: it contains {vector_store.get_dimensionality()} embeddings.")
@@ -1,3 +1,4 @@
+from functools import cached_property
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 from exam import DIR_ROOT, Question
@@ -77,15 +78,24 @@ def save_cache(
         return yaml
 
 
+# Parsed cache files by question id, as (mtime_ns, answer): re-read only when the file changes
+_LOADED_CACHES: dict[str, tuple[int, Answer]] = {}
+
+
 def load_cache(question: Question) -> Answer | None:
     cache_file_path = cache_file(question)
-    if not cache_file_path.exists():
+    try:
+        mtime = cache_file_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        _LOADED_CACHES.pop(question.id, None)
         return None
+    if (loaded := _LOADED_CACHES.get(question.id)) and loaded[0] == mtime:
+        return loaded[1]
     with open(cache_file_path, "r", encoding="utf-8") as f:
         print(f"# loading cached answer from {cache_file_path}")
         try:
             cached_answer = safe_load(f)
-            return Answer(
+            answer = Answer(
                 core=cached_answer.get("core", []),
                 details_important=cached_answer.get("details_important", []),
             )
@@ -93,12 +103,21 @@ def load_cache(question: Question) -> Answer | None:
             print(f"# error loading cached answer from {cache_file_path}: {e}")
             cache_file_path.unlink()
             return None
+    _LOADED_CACHES[question.id] = (mtime, answer)
+    return answer
 
 class SolutionProvider(AIOracle):
     def __init__(self, model_name: str = None, model_provider: str = "bge-large"):
         super().__init__(model_name, model_provider, Answer)
-        self.__vector_store = sqlite_vector_store()
-        self.__use_helps = self.__vector_store.get_dimensionality() > 0
+
+    # The vector store is opened on the first cache miss: cached answers never need it
+    @cached_property
+    def __vector_store(self):
+        return sqlite_vector_store()
+
+    @cached_property
+    def __use_helps(self):
+        return self.__vector_store.get_dimensionality() > 0
 
     def answer(self, question: Question, max_helps=5) -> Answer:
         if (cache := load_cache(question)):